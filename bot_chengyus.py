@@ -1,12 +1,17 @@
 import os
+import sys
+import csv
+import json
+import zipfile
+import codecs
 import logging
 import asyncio
 import aiohttp
-import pandas as pd
 import random
-from threading import Thread
-from flask import Flask
+from xml.etree import ElementTree
+from aiohttp import web
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -21,96 +26,593 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Servidor Flask mínimo para puerto dummy que Render detecta como vivo
-flask_app = Flask(__name__)
+# Servidor aiohttp mínimo para puerto dummy que Render detecta como vivo,
+# corre en el mismo event loop que el bot en lugar de un hilo aparte
+async def health_check(request):
+    return web.Response(text="Bot is running")
 
-@flask_app.route("/")
-def health_check():
-    return "Bot is running", 200
+async def health(request):
+    return web.json_response({"status": "ok", "uptime": "running"})
 
-@flask_app.route("/health")
-def health():
-    return {"status": "ok", "uptime": "running"}, 200
+_web_runner = None
 
-def run_flask():
+async def start_health_server(application=None):
+    global _web_runner
+    web_app = web.Application()
+    web_app.router.add_get("/", health_check)
+    web_app.router.add_get("/health", health)
+    _web_runner = web.AppRunner(web_app)
+    await _web_runner.setup()
     port = int(os.getenv("PORT", 10000))
-    flask_app.run(host="0.0.0.0", port=port, debug=False)
+    await web.TCPSite(_web_runner, host="0.0.0.0", port=port).start()
+    logger.info("🌐 Servidor de salud escuchando en el puerto %s", port)
+
+async def stop_health_server(application=None):
+    if _web_runner is not None:
+        await _web_runner.cleanup()
+
+# Modo webhook opcional (USE_WEBHOOK=1 y PUBLIC_URL); por defecto se usa polling.
+# En webhook el servidor de PTB ocupa PORT, así que no se levanta el de salud.
+# En Railway, sin PUBLIC_URL se usa el dominio público que expone la plataforma
+USE_WEBHOOK = os.getenv("USE_WEBHOOK", "").lower() in ("1", "true", "yes")
+RAILWAY_DOMAIN = os.getenv("RAILWAY_PUBLIC_DOMAIN", "")
+PUBLIC_URL = os.getenv("PUBLIC_URL") or (f"https://{RAILWAY_DOMAIN}" if RAILWAY_DOMAIN else "")
+
+# IDs de Telegram autorizados para /reload, separados por comas
+ADMIN_IDS = {
+    int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip().isdigit()
+}
+
+# Conexiones HTTP/2 persistentes hacia api.telegram.org; con el pool por defecto
+# (1 conexión) las respuestas de handlers concurrentes esperan turno
+TELEGRAM_POOL_SIZE = 8
+
+def telegram_request(pool_size=TELEGRAM_POOL_SIZE):
+    return HTTPXRequest(connection_pool_size=pool_size, http_version="2", pool_timeout=1.0)
 
 # Tarea asíncrona que mantiene el bot despierto haciendo ping a la URL cada 10 minutos
 KEEPALIVE_URL = os.getenv("KEEPALIVE_URL", "https://bot-chengyus-railway.onrender.com/")
 INTERVAL = 10 * 60  # 10 minutos
 
+# Sesión HTTP compartida; se crea dentro del loop y se cierra en post_shutdown
+_http_session = None
+
+def get_http_session():
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=4,
+            keepalive_timeout=INTERVAL + 30,  # que la conexión sobreviva entre pings
+            enable_cleanup_closed=True,
+        )
+        _http_session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=10)
+        )
+    return _http_session
+
+async def close_http_session(application=None):
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+
+async def shutdown_services(application=None):
+    await stop_health_server(application)
+    await close_http_session(application)
+
 async def keep_alive():
-    async with aiohttp.ClientSession() as session:
-        while True:
-            try:
-                await session.get(KEEPALIVE_URL, timeout=10)
-            except Exception:
-                pass
-            await asyncio.sleep(INTERVAL)
+    session = get_http_session()
+    while True:
+        try:
+            # Leer la respuesta devuelve la conexión al pool para reutilizarla
+            async with session.get(KEEPALIVE_URL) as response:
+                await response.read()
+        except Exception:
+            pass
+        await asyncio.sleep(INTERVAL)
+
+# Archivos de datos candidatos, en orden de prioridad
+EXCEL_FILES = [
+    "tabla-chengyus-completa.xlsx",
+    "tabla chengyus completa.xlsx",
+    "chengyus.xlsx",
+    "chengyus_data.xlsx",
+    "data.xlsx",
+]
+CSV_FILES = [
+    "tabla chengyus completa.csv",
+    "chengyus_data.csv",
+    "tabla-chengyus-completa.csv",
+    "chengyus.csv",
+]
+
+# Motores de lectura de Excel en orden de preferencia
+EXCEL_ENGINES = ("calamine", "openpyxl")
+
+# Niveles HSK aceptados por /hsk
+NIVELES_VALIDOS = frozenset({"HSK6", "HSK7", "HSK8", "HSK9"})
+
+# Columnas donde puede venir el nivel HSK, en orden de prioridad
+COLUMNAS_NIVEL = [
+    "Nivel de Dificultad",
+    "Nivel de Dificulatad",
+    "Nivel",
+    "HSK",
+    "level",
+    "Level",
+]
+
+# Columnas candidatas de cada campo mostrado, resueltas una vez tras la carga
+COLUMNAS_CAMPOS = {
+    "chengyu": ["Chengyu 成语", "Chengyu", "chengyu"],
+    "pinyin": ["Pinyin", "pinyin"],
+    "literal": ["Traduccion Literal", "literal"],
+    "significado": ["Significado Figurativo", "Significado", "significado"],
+    "venezolano": ["Equivalente en Venezolano", "Equivalente", "venezolano"],
+    "categoria": ["Categoria", "categoria"],
+    "nivel": ["Nivel de Dificultad", "Nivel", "HSK"],
+    "ejemplo": ["Frase de Ejemplo", "Ejemplo", "frase"],
+}
+
+# Alias de columnas -> nombre normalizado
+COLUMN_MAPPING = {
+    "chengyu": "Chengyu 成语",
+    "CHENGYU": "Chengyu 成语",
+    "Chengyu": "Chengyu 成语",
+    "pinyin": "Pinyin",
+    "PINYIN": "Pinyin",
+    "traduccion literal": "Traduccion Literal",
+    "Traducción Literal": "Traduccion Literal",
+    "literal": "Traduccion Literal",
+    "significado figurativo": "Significado Figurativo",
+    "Significado": "Significado Figurativo",
+    "significado": "Significado Figurativo",
+    "equivalente en venezolano": "Equivalente en Venezolano",
+    "equivalente": "Equivalente en Venezolano",
+    "refran": "Equivalente en Venezolano",
+    "refrán": "Equivalente en Venezolano",
+    "venezolano": "Equivalente en Venezolano",
+    "categoria": "Categoria",
+    "categoría": "Categoria",
+    "category": "Categoria",
+    "tema": "Categoria",
+    "nivel de dificultad": "Nivel de Dificultad",
+    "nivel": "Nivel de Dificultad",
+    "hsk": "Nivel de Dificultad",
+    "HSK": "Nivel de Dificultad",
+    "frase de ejemplo": "Frase de Ejemplo",
+    "ejemplo": "Frase de Ejemplo",
+    "frase": "Frase de Ejemplo",
+}
+
+# Únicas columnas que se leen de Excel/CSV (con sus alias); el resto se descarta al parsear
+COLUMNAS_UTILES = frozenset(
+    [*COLUMN_MAPPING, *COLUMN_MAPPING.values(), *COLUMNAS_NIVEL, "Refran", "Refrán"]
+    + [col for candidatas in COLUMNAS_CAMPOS.values() for col in candidatas]
+)
+
+def mapa_renombre(columnas):
+    """Alias -> nombre normalizado, sin pisar una columna que ya tenga el nombre final"""
+    presentes = set(columnas)
+    to_rename = {}
+    for old_name, new_name in COLUMN_MAPPING.items():
+        if old_name in presentes and new_name not in presentes:
+            to_rename[old_name] = new_name
+            presentes.discard(old_name)
+            presentes.add(new_name)
+    return to_rename
+
+def limpiar_valor(valor):
+    """Celda como str sin espacios; vacía -> "N/A" """
+    valor = valor.strip()
+    return valor if valor and valor != "nan" else "N/A"
+
+def limpiar_nombre(col):
+    return col.strip() if isinstance(col, str) else col
+
+def usar_columna(col):
+    # Se compara sin espacios sobrantes ("Pinyin " también cuenta)
+    return limpiar_nombre(col) in COLUMNAS_UTILES
+
+# dtype al leer: categorías y niveles como category (valores muy repetidos), el resto texto
+COLUMNAS_CATEGORICAS = ("Categoria", "Nivel de Dificultad")
+DTYPES_LECTURA = {
+    col: "category"
+    if col in COLUMNAS_CATEGORICAS
+    or COLUMN_MAPPING.get(col) in COLUMNAS_CATEGORICAS
+    or col in COLUMNAS_NIVEL
+    else "string"
+    for col in COLUMNAS_UTILES
+}
+
+# Errores esperables al parsear un archivo candidato (formato, codificación, hoja vacía),
+# registrados en DEBUG. Un OSError (p. ej. permisos) se registra como WARNING y también
+# se pasa al siguiente candidato, hasta llegar a los datos embebidos si hace falta.
+# ParserError y EmptyDataError de pandas heredan de ValueError
+ERRORES_LECTURA = (
+    ValueError,
+    csv.Error,
+    UnicodeDecodeError,
+)
+
+def errores_excel():
+    """ERRORES_LECTURA más los de un .xlsx corrupto o truncado con cada motor.
+
+    Los motores se importan aquí, igual que pandas, solo cuando hay un Excel que leer.
+    """
+    errores = [
+        *ERRORES_LECTURA,
+        zipfile.BadZipFile,
+        ElementTree.ParseError,
+        KeyError,  # openpyxl: parte que falta dentro del zip ("There is no item named ...")
+    ]
+    try:
+        from python_calamine import CalamineError  # XmlError, ZipError, etc. heredan de aquí
+
+        errores.append(CalamineError)
+    except ImportError:
+        pass
+    try:
+        from openpyxl.utils.exceptions import InvalidFileException
+
+        errores.append(InvalidFileException)
+    except ImportError:
+        pass
+    return tuple(errores)
+
+# Caché de las columnas ya limpias (dict de listas de str en JSON, sin el riesgo de
+# ejecutar código de un pickle): un arranque en caliente no importa pandas ni vuelve
+# a parsear el Excel. El sidecar guarda archivo origen, mtime y tamaño
+DATA_CACHE = "chengyus.cache.json"
+DATA_CACHE_META = "chengyus.cache.meta.json"
+
+def firma_archivo(path):
+    """mtime en ns y tamaño: cambia si el archivo se reescribe aunque sea en el mismo segundo"""
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+# Bytes del inicio de cada CSV que se miran para detectar codificación y separador
+SNIFF_BYTES = 64 * 1024
+
+# Segundos que un comando espera a que termine la carga inicial antes de responder
+ESPERA_CARGA = 5
+
+# Telegram límite es 4096 chars por mensaje, dejamos margen
+MAX_MESSAGE_LEN = 4000
+
+def split_message(lineas, limite=MAX_MESSAGE_LEN):
+    """Agrupa líneas en mensajes de hasta `limite` chars sin cortar ninguna línea"""
+    partes, actual, tam = [], [], 0
+    for linea in lineas:
+        if actual and tam + len(linea) > limite:
+            partes.append("".join(actual))
+            actual, tam = [], 0
+        actual.append(linea)
+        tam += len(linea)
+    if actual:
+        partes.append("".join(actual))
+    return partes
+
+# Caracteres reservados de MarkdownV2 de Telegram, escapados con barra invertida
+_MARKDOWN_V2_ESCAPES = str.maketrans({c: "\\" + c for c in "\\_*[]()~`>#+-=|{}.!"})
+
+def escape_md(text):
+    return str(text).translate(_MARKDOWN_V2_ESCAPES)
+
+# Textos fijos de /start y /ayuda
+WELCOME_MSG = """
+🇨🇳 *Bot de Chengyus Chino-Venezolanos* 🇻🇪
+
+¡Aprende expresiones idiomáticas chinas con sus equivalentes en refranes venezolanos!
+
+*Comandos disponibles:*
+/chengyu - Obtén un chengyu aleatorio
+/dia [1-50] - Chengyu específico por día
+/categorias - Explora por categorías
+/quiz - Test interactivo de práctica
+/hsk [HSK6/HSK7/HSK8/HSK9] - Filtrar por nivel
+/ayuda - Muestra esta ayuda
+
+¡Empieza tu aprendizaje cultural ahora! 🎓
+"""
+
+HELP_MSG = """
+🇨🇳 *Ayuda - Bot de Chengyus* 🇻🇪
+
+*Comandos:*
+/start - Mensaje de bienvenida
+/chengyu - Chengyu aleatorio
+/dia [1-50] - Chengyu por número
+/categorias - Explorar categorías
+/hsk [HSK6-9] - Filtrar por nivel
+/quiz - Quiz interactivo
+/ayuda - Mostrar esta ayuda
+
+*Ejemplos:*
+`/dia 15` - Chengyu del día 15
+`/hsk HSK7` - Chengyus nivel HSK7
+
+Los chengyus son expresiones idiomáticas chinas de 4 caracteres con gran significado cultural.
+
+¡Disfruta aprendiendo! 🎓
+"""
+
+# Ficha de un chengyu en MarkdownV2; los campos llegan ya escapados
+PLANTILLA_CHENGYU = (
+    "\n🎋 *{chengyu}* \\({pinyin}\\)\n\n"
+    "📜 *Traducción literal:* {literal}\n"
+    "💡 *Significado:* {significado}\n\n"
+    "🇻🇪 *Equivalente venezolano:*\n"
+    '"_{venezolano}_"\n'
+    "{ejemplo_block}"
+    "\n📌 *Categoría:* {categoria}\n🏮 *Nivel HSK:* {nivel}\n"
+)
+PLANTILLA_EJEMPLO = "\n📝 *Ejemplo en chino:*\n{ejemplo}\n"
 
 class ChengyuBot:
-    def __init__(self):
-        """Inicialización y carga de datos"""
-        self.df = pd.DataFrame()
+    # Atributos fijos: sin __dict__ por instancia y acceso directo por offset
+    __slots__ = (
+        "df",
+        "categorias",
+        "_categorias_markup",
+        "_by_hsk",
+        "_by_category",
+        "_hsk_chunks",
+        "_cols",
+        "_campos",
+        "_columnas",
+        "_formatted",
+        "_preguntas",
+        "_opciones_quiz",
+        "_quiz_pool",
+        "_n",
+        "data_source",
+        "source_file",
+        "_archivos",
+        "_rand",
+        "_randrange",
+        "_choice",
+        "_sample",
+        "_shuffle",
+        "_listo",
+        "_carga",
+    )
+
+    # Estado ligado a esta instancia que no se copia desde una recarga
+    _NO_COPIAR = ("_listo", "_carga")
+
+    def __init__(self, load_data=True):
+        """Inicialización; con load_data=False los datos se cargan luego con load_chengyus_data"""
+        self.df = None
         self.categorias = []
+        self._categorias_markup = None
+        self._by_hsk = {}
+        self._by_category = {}
+        self._hsk_chunks = {}
+        self._cols = {}
+        self._campos = {}
+        self._columnas = None
+        self._formatted = []
+        self._preguntas = []
+        self._opciones_quiz = []
+        self._quiz_pool = range(0)
+        self._n = 0
         self.data_source = "ninguno"
-        self.load_chengyus_data()
+        self.source_file = None
+        self._archivos = frozenset()
+        # Generador propio y sus métodos ya ligados para los handlers
+        self._rand = random.Random()
+        self._randrange = self._rand.randrange
+        self._choice = self._rand.choice
+        self._sample = self._rand.sample
+        self._shuffle = self._rand.shuffle
+        # Se marca cuando termina la primera carga (con o sin datos)
+        self._listo = asyncio.Event()
+        # Tarea de la carga en segundo plano, para cancelarla al apagar
+        self._carga = None
+        if load_data:
+            self.load_chengyus_data()
+            self._listo.set()
+
+    async def initialize(self):
+        """Carga (o recarga) los datos en un hilo sin bloquear el event loop.
+
+        Se carga sobre una instancia nueva y el estado se copia de golpe desde
+        el loop, así los handlers nunca ven datos a medio construir.
+        """
+        nuevo = ChengyuBot(load_data=False)
+        try:
+            try:
+                await asyncio.to_thread(nuevo.load_chengyus_data)
+            except Exception:
+                # En una recarga se conservan los datos actuales (/reload informa el error);
+                # en el arranque se sirve al menos con los datos embebidos
+                if self._n:
+                    raise
+                logger.exception("❌ Error cargando datos, se usan los embebidos")
+                nuevo = ChengyuBot(load_data=False)
+                nuevo.load_embedded_data()
+                nuevo.data_source = "embebidos"
+            # Copia sin awaits de por medio: ningún handler ve el estado a medias.
+            # El evento en el que esperan los handlers es el de self
+            for attr in ChengyuBot.__slots__:
+                if attr not in ChengyuBot._NO_COPIAR:
+                    setattr(self, attr, getattr(nuevo, attr))
+            logger.info("✅ Datos listos: %s chengyus (%s)", self._n, self.data_source)
+        finally:
+            # Aunque la carga falle, los comandos dejan de esperar y responden al momento
+            self._listo.set()
+
+    def start_loading(self):
+        """Lanza initialize() en el loop actual y guarda la tarea.
+
+        Se usa en post_init, antes de Application.start(): application.create_task
+        avisaría que la tarea no se espera y PTB no la seguiría al apagar.
+        """
+        self._carga = asyncio.get_running_loop().create_task(self.initialize())
+
+    async def stop_loading(self):
+        """Cancela la carga si sigue en curso (el hilo de to_thread termina solo)"""
+        if self._carga is None:
+            return
+        if not self._carga.done():
+            self._carga.cancel()
+        try:
+            await self._carga
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("Error en la carga de datos: %s", e)
+
+    async def esperar_datos(self):
+        """Si la carga inicial sigue en curso, espera hasta ESPERA_CARGA segundos"""
+        if self._listo.is_set():
+            return
+        try:
+            await asyncio.wait_for(self._listo.wait(), ESPERA_CARGA)
+        except asyncio.TimeoutError:
+            pass
 
     def load_chengyus_data(self):
-        logger.info("🔄 Iniciando carga de datos desde Excel...")
-        if self.load_excel_files():
+        # Un solo listdir en lugar de un exists() por cada archivo candidato
+        self._archivos = frozenset(os.listdir("."))
+        if self.load_cache():
+            self.data_source = "caché"
+        elif self.load_excel_files():
             self.data_source = "Excel"
-            return
-        if self.load_csv_fallback():
+            self.save_cache()
+        elif self.load_csv_fallback():
+            # Sin caché: el módulo csv lee unos miles de filas casi tan rápido como la caché JSON
             self.data_source = "CSV backup"
+        else:
+            logger.warning("⚠️ Usando datos embebidos limitados")
+            self.load_embedded_data()
+            self.data_source = "embebidos"
+        # Los handlers solo usan las estructuras precalculadas; el DataFrame
+        # se libera para no mantener residentes el BlockManager y sus arrays
+        self.df = None
+        self._columnas = None
+
+    def load_cache(self):
+        """Carga la caché JSON si el archivo origen no cambió desde que se escribió"""
+        if DATA_CACHE not in self._archivos or DATA_CACHE_META not in self._archivos:
+            return False
+        try:
+            with open(DATA_CACHE_META, encoding="utf-8") as f:
+                meta = json.load(f)
+            source_file = meta["source"]
+            if source_file not in self._archivos or firma_archivo(source_file) != meta["firma"]:
+                logger.info("♻️ Caché desactualizada, se vuelve a parsear el origen")
+                return False
+            # Un archivo candidato más nuevo que la caché (p. ej. un Excel recién subido) también la invalida
+            cache_mtime = os.path.getmtime(DATA_CACHE)
+            for candidato in EXCEL_FILES + CSV_FILES:
+                if candidato in self._archivos and os.path.getmtime(candidato) > cache_mtime:
+                    logger.info("♻️ %s es más nuevo que la caché", candidato)
+                    return False
+            with open(DATA_CACHE, encoding="utf-8") as f:
+                columnas = json.load(f)
+            self.source_file = source_file
+            self.build_from_columns(columnas)
+            logger.info("✅ Caché cargada: %s chengyus de %s", self._n, source_file)
+            return self._n > 0
+        except Exception as e:
+            logger.debug("Error leyendo caché: %s", e)
+            return False
+
+    def save_cache(self):
+        """Guarda las columnas limpias en JSON junto a la firma del archivo del que salieron"""
+        if self.source_file is None or self._columnas is None:
             return
-        logger.warning("⚠️ Usando datos embebidos limitados")
-        self.load_embedded_data()
-        self.data_source = "embebidos"
+        try:
+            with open(DATA_CACHE, "w", encoding="utf-8") as f:
+                json.dump(self._columnas, f, ensure_ascii=False, separators=(",", ":"))
+            meta = {"source": self.source_file, "firma": firma_archivo(self.source_file)}
+            with open(DATA_CACHE_META, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+        except Exception as e:
+            logger.debug("No se pudo escribir la caché: %s", e)
 
     def load_excel_files(self):
-        excel_files = [
-            "tabla-chengyus-completa.xlsx",
-            "tabla chengyus completa.xlsx",
-            "chengyus.xlsx",
-            "chengyus_data.xlsx",
-            "data.xlsx",
-        ]
-        for excel_file in excel_files:
-            if not os.path.exists(excel_file):
+        # Sin ningún .xlsx presente no se llega a tocar el motor de Excel (ni a importarlo)
+        existentes = [f for f in EXCEL_FILES if f in self._archivos]
+        if not existentes:
+            logger.info("ℹ️ No hay archivos Excel, se pasa al CSV")
+            return False
+        logger.info("🔄 Iniciando carga de datos desde Excel...")
+        errores = errores_excel()
+        for excel_file in existentes:
+            logger.info("📂 Intentando cargar %s", excel_file)
+            xls = self.open_excel(excel_file)
+            if xls is None:
                 continue
-            logger.info(f"📂 Intentando cargar {excel_file}")
-            sheet_names = [
-                0,
-                "Sheet1",
-                "tabla_chengyus_completa_con_ref",
-                "tabla-chengyus-completa",
-                "Datos",
-                "chengyus",
-                "Data",
-            ]
-            for sheet in sheet_names:
-                try:
-                    df_test = pd.read_excel(
-                        excel_file, sheet_name=sheet, engine="openpyxl"
-                    )
-                    if df_test.empty or len(df_test) < 10:
-                        continue
-                    if not self.validate_essential_columns(df_test):
-                        continue
-                    self.df = df_test
-                    self.process_loaded_data()
-                    logger.info(
-                        f"✅ Excel cargado: {len(self.df)} chengyus desde {excel_file}, hoja {sheet}"
-                    )
-                    return True
-                except Exception as e:
-                    logger.debug(f"Error con {excel_file} hoja {sheet}: {e}")
+            try:
+                preferidas = [
+                    "Sheet1",
+                    "tabla_chengyus_completa_con_ref",
+                    "tabla-chengyus-completa",
+                    "Datos",
+                    "chengyus",
+                    "Data",
+                ]
+                # Solo hojas que existen: la primera, luego las preferidas y después el resto
+                hojas = xls.sheet_names
+                candidatas = dict.fromkeys(
+                    hojas[:1] + [h for h in preferidas if h in hojas] + hojas
+                )
+                for sheet in candidatas:
+                    try:
+                        # Descartar hojas sin filas suficientes antes de parsearlas
+                        if xls.engine == "openpyxl":
+                            max_row = xls.book[sheet].max_row
+                            if max_row is not None and max_row <= 10:
+                                continue
+                        df_test = xls.parse(sheet, usecols=usar_columna, dtype=DTYPES_LECTURA)
+                        df_test = df_test.rename(columns=limpiar_nombre)
+                        if df_test.empty or len(df_test) < 10:
+                            continue
+                        if not self.validate_essential_columns(df_test.columns):
+                            continue
+                        self.df = df_test
+                        self.source_file = excel_file
+                        self.process_loaded_data()
+                        # process_loaded_data registra y absorbe sus errores: sin filas
+                        # publicadas se sigue con la siguiente hoja o archivo
+                        if not self._n:
+                            continue
+                        logger.info(
+                            "✅ Excel cargado: %s chengyus desde %s, hoja %s",
+                            self._n, excel_file, sheet,
+                        )
+                        return True
+                    except errores as e:
+                        logger.debug("Error con %s hoja %s: %s", excel_file, sheet, e)
+                    except OSError as e:
+                        logger.warning("⚠️ No se pudo leer %s hoja %s: %s", excel_file, sheet, e)
+            finally:
+                xls.close()
         logger.warning("❌ No se pudo cargar archivo Excel válido")
         return False
 
-    def validate_essential_columns(self, df):
+    def open_excel(self, excel_file):
+        """Abre el libro una sola vez, probando calamine antes que openpyxl"""
+        # calamine (Rust) parsea el xlsx en código nativo; openpyxl queda como
+        # respaldo y en pandas se abre con read_only=True y data_only=True.
+        # pandas se importa aquí: sin Excel ni caché el bot arranca sin cargarlo
+        import pandas as pd
+
+        for engine in EXCEL_ENGINES:
+            try:
+                return pd.ExcelFile(excel_file, engine=engine)
+            except OSError as e:
+                # Archivo ilegible (permisos, disco): otro motor tampoco podrá abrirlo
+                logger.warning("⚠️ No se pudo abrir %s: %s", excel_file, e)
+                return None
+            except (ImportError, ValueError) as e:
+                logger.debug("Motor %s no disponible para %s: %s", engine, excel_file, e)
+            except Exception as e:
+                logger.debug("Error abriendo %s con %s: %s", excel_file, engine, e)
+        return None
+
+    def validate_essential_columns(self, columnas):
         chengyu_cols = ["Chengyu 成语", "Chengyu", "chengyu", "CHENGYU"]
         pinyin_cols = ["Pinyin", "pinyin", "PINYIN"]
         venezolano_cols = [
@@ -120,130 +622,224 @@ class ChengyuBot:
             "Refrán",
             "venezolano",
         ]
-        has_chengyu = any(col in df.columns for col in chengyu_cols)
-        has_pinyin = any(col in df.columns for col in pinyin_cols)
-        has_venezolano = any(col in df.columns for col in venezolano_cols)
+        has_chengyu = any(col in columnas for col in chengyu_cols)
+        has_pinyin = any(col in columnas for col in pinyin_cols)
+        has_venezolano = any(col in columnas for col in venezolano_cols)
         return has_chengyu and (has_pinyin or has_venezolano)
     def load_csv_fallback(self):
-        csv_files = [
-            "tabla chengyus completa.csv",
-            "chengyus_data.csv",
-            "tabla-chengyus-completa.csv",
-            "chengyus.csv",
-        ]
-        for csv_file in csv_files:
-            if not os.path.exists(csv_file):
+        """CSV de respaldo con el módulo csv de la stdlib, directo a listas por columna"""
+        for csv_file in CSV_FILES:
+            if csv_file not in self._archivos:
                 continue
-            logger.info(f"📂 Intentando CSV fallback: {csv_file}")
-            encodings = ["utf-8", "utf-8-sig", "latin-1", "cp1252"]
-            for encoding in encodings:
+            logger.info("📂 Intentando CSV fallback: %s", csv_file)
+            try:
+                with open(csv_file, "rb") as f:
+                    encoding, sep = self.sniff_csv(f.read(SNIFF_BYTES))
                 try:
-                    df_test = pd.read_csv(csv_file, encoding=encoding)
-                    if df_test.empty or len(df_test) < 10:
-                        continue
-                    if not self.validate_essential_columns(df_test):
-                        continue
-                    self.df = df_test
-                    self.process_loaded_data()
-                    logger.info(f"✅ CSV fallback cargado: {len(self.df)} chengyus")
-                    return True
-                except Exception:
+                    columnas = self.read_csv_columns(csv_file, encoding, sep)
+                except UnicodeDecodeError as e:
+                    # Byte inválido más allá de la muestra del sniff: se relee con el mismo
+                    # códec y solo ese byte pasa a U+FFFD. Releer como latin-1 rompería
+                    # todos los caracteres chinos (y el encabezado "Chengyu 成语")
+                    logger.warning("⚠️ %s tiene bytes que no son %s: %s", csv_file, encoding, e)
+                    columnas = self.read_csv_columns(csv_file, encoding, sep, errors="replace")
+                if columnas is None or len(next(iter(columnas.values()), [])) < 10:
                     continue
+                self.source_file = csv_file
+                self.build_from_columns(columnas)
+                logger.info("✅ CSV fallback cargado: %s chengyus (%s, '%s')", self._n, encoding, sep)
+                return True
+            except ERRORES_LECTURA as e:
+                logger.debug("Error con CSV %s: %s", csv_file, e)
+            except OSError as e:
+                logger.warning("⚠️ No se pudo leer %s: %s", csv_file, e)
         return False
 
+    def read_csv_columns(self, csv_file, encoding, sep, errors="strict"):
+        """Recorre el CSV fila a fila guardando solo las columnas útiles.
+
+        Devuelve None si el encabezado no trae las columnas esenciales. El archivo
+        se lee en streaming: nunca está entero en memoria, ni en bytes ni en texto.
+        """
+        with open(csv_file, encoding=encoding, errors=errors, newline="") as f:
+            reader = csv.reader(f, delimiter=sep)
+            encabezado = [limpiar_nombre(col) for col in next(reader, [])]
+            # Se valida con el encabezado antes de recorrer ninguna fila
+            if not self.validate_essential_columns(encabezado):
+                return None
+            # Solo las columnas útiles (equivalente a usecols), ya con nombre normalizado
+            to_rename = mapa_renombre(encabezado)
+            columnas, utiles = {}, []
+            for i, col in enumerate(encabezado):
+                col = to_rename.get(col, col)
+                # Un encabezado repetido se queda con su primera aparición
+                if col in COLUMNAS_UTILES and col not in columnas:
+                    columnas[col] = []
+                    utiles.append((i, col))
+            ancho = len(encabezado)
+            for fila in reader:
+                if len(fila) < ancho:
+                    fila += [""] * (ancho - len(fila))
+                for i, col in utiles:
+                    columnas[col].append(limpiar_valor(fila[i]))
+        return columnas
+
+    def sniff_csv(self, head):
+        """Detecta codificación y separador mirando solo el inicio del archivo"""
+        if head.startswith(codecs.BOM_UTF8):
+            encoding = "utf-8-sig"
+        else:
+            encoding = "utf-8"
+            try:
+                # Decodificador incremental: un carácter cortado al final de la muestra no es error
+                codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+            except UnicodeDecodeError:
+                encoding = "latin-1"  # nunca falla al decodificar
+        texto = head.decode(encoding, errors="ignore")
+        try:
+            sep = csv.Sniffer().sniff(texto, delimiters=",;\t").delimiter
+        except csv.Error:
+            sep = ","
+        return encoding, sep
+
     def process_loaded_data(self):
         try:
-            self.df = self.df.dropna(how="all")
-            column_mapping = {
-                "chengyu": "Chengyu 成语",
-                "CHENGYU": "Chengyu 成语",
-                "Chengyu": "Chengyu 成语",
-                "pinyin": "Pinyin",
-                "PINYIN": "Pinyin",
-                "traduccion literal": "Traduccion Literal",
-                "Traducción Literal": "Traduccion Literal",
-                "literal": "Traduccion Literal",
-                "significado figurativo": "Significado Figurativo",
-                "Significado": "Significado Figurativo",
-                "significado": "Significado Figurativo",
-                "equivalente en venezolano": "Equivalente en Venezolano",
-                "equivalente": "Equivalente en Venezolano",
-                "refran": "Equivalente en Venezolano",
-                "refrán": "Equivalente en Venezolano",
-                "venezolano": "Equivalente en Venezolano",
-                "categoria": "Categoria",
-                "categoría": "Categoria",
-                "category": "Categoria",
-                "tema": "Categoria",
-                "nivel de dificultad": "Nivel de Dificultad",
-                "nivel": "Nivel de Dificultad",
-                "hsk": "Nivel de Dificultad",
-                "HSK": "Nivel de Dificultad",
-                "frase de ejemplo": "Frase de Ejemplo",
-                "ejemplo": "Frase de Ejemplo",
-                "frase": "Frase de Ejemplo",
+            # Un solo rename: reconstruir el Index una vez y no por cada alias
+            to_rename = mapa_renombre(self.df.columns)
+            if to_rename:
+                self.df = self.df.rename(columns=to_rename)
+            logger.info("📋 Columnas normalizadas: %s", list(self.df.columns))
+            logger.info("📊 Total de chengyus procesados: %s", len(self.df))
+            resueltas = {
+                next((c for c in candidatas if c in self.df.columns), None)
+                for candidatas in COLUMNAS_CAMPOS.values()
             }
-            for old_name, new_name in column_mapping.items():
-                if old_name in self.df.columns and new_name not in self.df.columns:
-                    self.df.rename(columns={old_name: new_name}, inplace=True)
-            logger.info(f"📋 Columnas normalizadas: {list(self.df.columns)}")
-            logger.info(f"📊 Total de chengyus procesados: {len(self.df)}")
-            if "Categoria" in self.df.columns:
-                self.categorias = self.df["Categoria"].dropna().unique().tolist()
-                logger.info(f"📚 Categorías encontradas: {len(self.categorias)}")
-            else:
-                self.categorias = ["General"]
-            if not self.df.empty:
-                logger.info(f"🔍 Muestra de datos: {self.df.head(1).to_dict('records')}")
+            # Proyección a las columnas que realmente se muestran o indexan: alias
+            # duplicados o columnas extra (p. ej. "Dia del año") no llegan a _campos
+            usadas = resueltas | set(COLUMNAS_NIVEL)
+            self.df = self.df.loc[:, [c for c in self.df.columns if c in usadas]]
+            # Una lista de str ya limpios por columna (sin NaN, sin espacios, vacíos -> "N/A")
+            limpio = self.df.astype(object).fillna("N/A").astype(str)
+            limpio = limpio.apply(lambda serie: serie.str.strip()).replace({"": "N/A", "nan": "N/A"})
+            self.build_from_columns({col: limpio[col].tolist() for col in limpio.columns})
         except Exception as e:
-            logger.error(f"Error procesando datos: {e}")
+            logger.error("Error procesando datos: %s", e)
 
-    def format_chengyu(self, row):
-        try:
-            chengyu = self.get_column_value(row, ["Chengyu 成语", "Chengyu", "chengyu"])
-            pinyin = self.get_column_value(row, ["Pinyin", "pinyin"])
-            literal = self.get_column_value(row, ["Traduccion Literal", "literal"])
-            significado = self.get_column_value(
-                row, ["Significado Figurativo", "Significado", "significado"]
-            )
-            venezolano = self.get_column_value(
-                row, ["Equivalente en Venezolano", "Equivalente", "venezolano"]
-            )
-            categoria = self.get_column_value(row, ["Categoria", "categoria"])
-            nivel = self.get_column_value(row, ["Nivel de Dificultad", "Nivel", "HSK"])
-            ejemplo = self.get_column_value(row, ["Frase de Ejemplo", "Ejemplo", "frase"])
+    def build_from_columns(self, columnas):
+        """Arma todas las estructuras de consulta desde listas de str limpios por columna.
 
-            formatted_text = f"""
-🎋 *{chengyu}* ({pinyin})
+        No usa pandas: sirve igual para lo leído de Excel/CSV/caché que para los
+        datos embebidos.
+        """
+        # Filas sin ningún valor se descartan aquí, en una pasada sobre las listas,
+        # en vez de un dropna que arma otro DataFrame
+        total = len(next(iter(columnas.values()), []))
+        filas = [
+            pos for pos, valores in enumerate(zip(*columnas.values()))
+            if any(valor != "N/A" for valor in valores)
+        ]
+        if len(filas) < total:
+            columnas = {col: [valores[pos] for pos in filas] for col, valores in columnas.items()}
+        n = len(filas)
+        self._columnas = columnas  # para save_cache; se suelta al terminar la carga
+        self._cols = {
+            campo: next((c for c in candidatas if c in columnas), None)
+            for campo, candidatas in COLUMNAS_CAMPOS.items()
+        }
+        # Sin un dict por fila: field() es indexar una lista.
+        # sys.intern: "N/A", categorías y niveles repetidos comparten un solo objeto str
+        self._campos = {
+            campo: [sys.intern(valor) for valor in columnas[col]] if col else ["N/A"] * n
+            for campo, col in self._cols.items()
+        }
+        # Texto de cada chengyu renderizado una sola vez, misma posición que _campos
+        self._formatted = [self.format_chengyu(pos) for pos in range(n)]
+        self._preguntas = [
+            "❓ *Quiz:* ¿Cuál es el equivalente venezolano de:\n\n"
+            f"*{escape_md(self.field(pos, 'chengyu'))}* \\({escape_md(self.field(pos, 'pinyin'))}\\)?"
+            for pos in range(n)
+        ]
+        # Texto de cada botón del quiz, recortado una sola vez
+        self._opciones_quiz = [
+            texto[:45] + "..." if len(texto) > 45 else texto
+            for texto in self._campos["venezolano"]
+        ]
+        self._quiz_pool = range(n)
+        self.build_indexes(columnas)
+        if "Categoria" in columnas:
+            # Claves del índice por categoría: solo categorías con filas, sin otro unique()
+            self.categorias = list(self._by_category)
+            logger.info("📚 Categorías encontradas: %s", len(self.categorias))
+        else:
+            self.categorias = ["General"]
+        # Teclado de /categorias fijo tras la carga (los objetos de PTB son inmutables)
+        self._categorias_markup = InlineKeyboardMarkup(
+            [
+                [InlineKeyboardButton(cat, callback_data=f"cat_{i}")]
+                for i, cat in enumerate(self.categorias[:20])
+            ]
+        )
+        # Se publica al final: con la carga en otro hilo, los handlers
+        # consideran listos los datos solo cuando _n > 0
+        self._n = n
+        if n:
+            logger.info("🔍 Muestra de datos: %s", {col: valores[0] for col, valores in columnas.items()})
 
-📜 *Traducción literal:* {literal}
-💡 *Significado:* {significado}
+    def build_indexes(self, columnas):
+        """Indexa posiciones de filas por nivel HSK normalizado y por categoría.
 
-🇻🇪 *Equivalente venezolano:*
-"_{venezolano}_"
-"""
-            if ejemplo and ejemplo != "N/A" and ejemplo.strip():
-                formatted_text += f"""
-📝 *Ejemplo en chino:*
-{ejemplo}
-"""
+        Las posiciones se guardan como tuplas de int: inmutables tras la carga y
+        más compactas que listas, random.choice las indexa en O(1).
+        """
+        self._by_hsk = {}
+        for col in COLUMNAS_NIVEL:
+            if col not in columnas:
+                continue
+            grupos = {}
+            for pos, valor in enumerate(columnas[col]):
+                grupos.setdefault(valor.replace(" ", "").upper(), []).append(pos)
+            # Cada nivel se queda con la primera columna que lo contiene
+            for nivel, posiciones in grupos.items():
+                self._by_hsk.setdefault(nivel, tuple(posiciones))
+        # Listado de /hsk ya formateado y partido en mensajes por nivel, se arma una sola vez
+        self._hsk_chunks = {}
+        for nivel, posiciones in self._by_hsk.items():
+            lineas = [f"🎓 *Todos los Chengyus nivel {escape_md(nivel)}* 🏮\n\n"]
+            for pos in posiciones:
+                chengyu = escape_md(self.field(pos, "chengyu"))
+                pinyin = escape_md(self.field(pos, "pinyin"))
+                nivel_row = escape_md(self.field(pos, "nivel"))
+                lineas.append(f"• {chengyu} \\({pinyin}\\) \\- \\[{nivel_row}\\]\n")
+            self._hsk_chunks[nivel] = split_message(lineas)
+        self._by_category = {}
+        if "Categoria" in columnas:
+            grupos = {}
+            for pos, categoria in enumerate(columnas["Categoria"]):
+                if categoria != "N/A":
+                    grupos.setdefault(categoria, []).append(pos)
+            # Orden de primera aparición en los datos: fija qué categorías entran en
+            # las 20 del teclado de /categorias y sus índices cat_<i>
+            self._by_category = {
+                categoria: tuple(posiciones) for categoria, posiciones in grupos.items()
+            }
 
-            formatted_text += f"""
-📌 *Categoría:* {categoria}
-🏮 *Nivel HSK:* {nivel}
-            """
-            return formatted_text
+    def format_chengyu(self, pos):
+        try:
+            campos = {campo: escape_md(valores[pos]) for campo, valores in self._campos.items()}
+            ejemplo = campos["ejemplo"]
+            # Una sola llamada a format_map sobre la plantilla fija; los valores ya vienen
+            # sin espacios y con "N/A" en los vacíos, basta una comparación
+            campos["ejemplo_block"] = (
+                PLANTILLA_EJEMPLO.format(ejemplo=ejemplo) if ejemplo != "N/A" else ""
+            )
+            return PLANTILLA_CHENGYU.format_map(campos)
         except Exception as e:
-            logger.error(f"Error formateando chengyu: {e}")
-            return "❌ Error al mostrar el chengyu. Intenta con otro comando."
+            logger.error("Error formateando chengyu: %s", e)
+            return escape_md("❌ Error al mostrar el chengyu. Intenta con otro comando.")
 
-    def get_column_value(self, row, possible_columns):
-        for col in possible_columns:
-            if col in row and pd.notna(row.get(col)):
-                value = str(row.get(col)).strip()
-                if value and value != "nan":
-                    return value
-        return "N/A"
+    def field(self, pos, campo):
+        """Valor limpio de un campo en la fila `pos`"""
+        return self._campos[campo][pos]
 
     def load_embedded_data(self):
         embedded_data = [
@@ -281,78 +877,63 @@ class ChengyuBot:
                 "Frase de Ejemplo": "他本来就很生气，你这样说话是火上加油。",
             },
         ]
-        self.df = pd.DataFrame(embedded_data)
-        self.process_loaded_data()
-        logger.info(f"✅ Datos embebidos cargados: {len(self.df)} chengyus")
+        # Ya vienen con nombres normalizados: directo a listas por columna, sin DataFrame
+        columnas = {col: [str(fila[col]) for fila in embedded_data] for col in embedded_data[0]}
+        self.build_from_columns(columnas)
+        logger.info("✅ Datos embebidos cargados: %s chengyus", self._n)
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        welcome_msg = """
-🇨🇳 *Bot de Chengyus Chino-Venezolanos* 🇻🇪
-
-¡Aprende expresiones idiomáticas chinas con sus equivalentes en refranes venezolanos!
-
-*Comandos disponibles:*
-/chengyu - Obtén un chengyu aleatorio
-/dia [1-50] - Chengyu específico por día
-/categorias - Explora por categorías
-/quiz - Test interactivo de práctica
-/hsk [HSK6/HSK7/HSK8/HSK9] - Filtrar por nivel
-/ayuda - Muestra esta ayuda
-
-¡Empieza tu aprendizaje cultural ahora! 🎓
-"""
-        await update.message.reply_text(welcome_msg, parse_mode="Markdown")
+        await update.message.reply_text(WELCOME_MSG, parse_mode="Markdown")
 
     async def random_chengyu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if self.df.empty:
+        await self.esperar_datos()
+        if not self._n:
             await update.message.reply_text(
                 "❌ Servicio temporalmente no disponible. Intenta más tarde."
             )
             return
         try:
-            chengyu = self.df.sample(1).iloc[0]
             await update.message.reply_text(
-                self.format_chengyu(chengyu), parse_mode="Markdown"
+                self._formatted[self._randrange(self._n)],
+                parse_mode="MarkdownV2",
             )
         except Exception as e:
-            logger.error(f"Error en random_chengyu: {e}")
+            logger.error("Error en random_chengyu: %s", e)
             await update.message.reply_text("❌ Error al obtener chengyu. Inténtalo de nuevo.")
 
     async def daily_chengyu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if self.df.empty:
+        await self.esperar_datos()
+        if not self._n:
             await update.message.reply_text(
                 "❌ Servicio temporalmente no disponible. Intenta más tarde."
             )
             return
+        # Solo el parseo del número se trata como error de uso
         try:
-            if not context.args:
-                await update.message.reply_text(f"❌ Uso correcto: /dia [número 1-{len(self.df)}]")
-                return
-            dia = int(context.args[0])
-            if 1 <= dia <= len(self.df):
-                chengyu = self.df.iloc[dia - 1]
-                await update.message.reply_text(
-                    self.format_chengyu(chengyu), parse_mode="Markdown"
-                )
-            else:
-                await update.message.reply_text(f"⚠️ El día debe estar entre 1 y {len(self.df)}")
-        except (ValueError, IndexError):
-            await update.message.reply_text(f"❌ Uso correcto: /dia [número 1-{len(self.df)}]")
+            dia = int(context.args[0]) if context.args else None
+        except ValueError:
+            dia = None
+        if dia is None:
+            await update.message.reply_text(f"❌ Uso correcto: /dia [número 1-{self._n}]")
+            return
+        if not 1 <= dia <= self._n:
+            await update.message.reply_text(f"⚠️ El día debe estar entre 1 y {self._n}")
+            return
+        try:
+            await update.message.reply_text(
+                self._formatted[dia - 1], parse_mode="MarkdownV2"
+            )
         except Exception as e:
-            logger.error(f"Error en daily_chengyu: {e}")
+            logger.error("Error en daily_chengyu: %s", e)
             await update.message.reply_text("❌ Error al obtener el chengyu del día.")
 
     async def show_categories(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not self.categorias:
+        await self.esperar_datos()
+        if not self.categorias or self._categorias_markup is None:
             await update.message.reply_text("❌ No hay categorías disponibles.")
             return
-        teclado = [
-            [InlineKeyboardButton(cat, callback_data=f"cat_{i}")]
-            for i, cat in enumerate(self.categorias[:20])
-        ]
-        reply_markup = InlineKeyboardMarkup(teclado)
         await update.message.reply_text(
             "📚 *Categorías disponibles:*\nSelecciona una categoría:",
-            reply_markup=reply_markup,
+            reply_markup=self._categorias_markup,
             parse_mode="Markdown",
         )
 
@@ -363,23 +944,24 @@ class ChengyuBot:
             idx = int(query.data.split("_")[1])
             if idx < len(self.categorias):
                 categoria = self.categorias[idx]
-                df_cat = self.df[self.df["Categoria"] == categoria]
-                if not df_cat.empty:
-                    chengyu = df_cat.sample(1).iloc[0]
+                posiciones = self._by_category.get(categoria, ())
+                if posiciones:
+                    texto = self._formatted[self._choice(posiciones)]
                     await query.edit_message_text(
-                        f"📖 *Categoría: {categoria}*\n\n{self.format_chengyu(chengyu)}",
-                        parse_mode="Markdown",
+                        f"📖 *Categoría: {escape_md(categoria)}*\n\n{texto}",
+                        parse_mode="MarkdownV2",
                     )
                 else:
                     await query.edit_message_text("❌ No hay chengyus en esa categoría.")
             else:
                 await query.edit_message_text("❌ Categoría no válida.")
         except Exception as e:
-            logger.error(f"Error en category_handler: {e}")
+            logger.error("Error en category_handler: %s", e)
             await query.edit_message_text("❌ Error al procesar la categoría.")
 
     async def hsk_filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if self.df.empty:
+        await self.esperar_datos()
+        if not self._n:
             await update.message.reply_text(
                 "❌ Servicio temporalmente no disponible. Intenta más tarde."
             )
@@ -391,129 +973,97 @@ class ChengyuBot:
                 )
                 return
             nivel_input = context.args[0].upper().replace(" ", "")
-            niveles_validos = ["HSK6", "HSK7", "HSK8", "HSK9"]
-            if nivel_input not in niveles_validos:
-                await update.message.reply_text(f"❌ Niveles válidos: {', '.join(niveles_validos)}")
+            if nivel_input not in NIVELES_VALIDOS:
+                await update.message.reply_text(f"❌ Niveles válidos: {', '.join(sorted(NIVELES_VALIDOS))}")
                 return
 
-            columnas_nivel = [
-                "Nivel de Dificultad",
-                "Nivel de Dificulatad",
-                "Nivel",
-                "HSK",
-                "level",
-                "Level",
-            ]
-            filtf = pd.DataFrame()
-            for col in columnas_nivel:
-                if col in self.df.columns:
-                    serie = self.df[col].astype(str).str.replace(" ", "").str.upper()
-                    filtf = self.df[serie == nivel_input]
-                    if not filtf.empty:
-                        break
-
-            if filtf.empty:
+            partes = self._hsk_chunks.get(nivel_input)
+            if not partes:
                 await update.message.reply_text(f"❌ No hay chengyus de nivel {nivel_input}.")
                 return
 
-            respuesta = f"🎓 *Todos los Chengyus nivel {nivel_input}* 🏮\n\n"
-            for _, row in filtf.iterrows():
-                chengyu = self.get_column_value(row, ["Chengyu 成语", "Chengyu"])
-                pinyin = self.get_column_value(row, ["Pinyin", "pinyin"])
-                nivel = self.get_column_value(row, ["Nivel de Dificultad", "Nivel", "HSK"])
-                respuesta += f"• {chengyu} ({pinyin}) - [{nivel}]\n"
-
-            # Telegram límite es 4096 chars, dividimos si hace falta
-            for part in [respuesta[i: i + 4000] for i in range(0, len(respuesta), 4000)]:
-                await update.message.reply_text(part, parse_mode="Markdown")
+            # Se envían en secuencia a propósito: con asyncio.gather Telegram no
+            # garantiza el orden y el encabezado o el listado podrían llegar desordenados
+            for part in partes:
+                await update.message.reply_text(
+                    part, parse_mode="MarkdownV2", disable_web_page_preview=True
+                )
 
         except Exception as e:
-            logger.error(f"Error en hsk_filter: {e}")
+            logger.error("Error en hsk_filter: %s", e)
             await update.message.reply_text(f"❌ Error al filtrar nivel HSK: {e}")
 
     async def quiz(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if self.df.empty or len(self.df) < 4:
+        await self.esperar_datos()
+        if self._n < 4:
             await update.message.reply_text("❌ Quiz temporalmente no disponible. Intenta más tarde.")
             return
         try:
-            correcto = self.df.sample(1).iloc[0]
-            opciones_erroneas = self.df[self.df.index != correcto.name].sample(3)
-            todas_opciones = [correcto] + opciones_erroneas.to_dict("records")
-            random.shuffle(todas_opciones)
-            index_correcto = None
-            for i, opt in enumerate(todas_opciones):
-                if (
-                    self.get_column_value(opt, ["Chengyu 成语", "Chengyu"])
-                    == self.get_column_value(correcto, ["Chengyu 成语", "Chengyu"])
-                ):
-                    index_correcto = i
-                    break
-
-            teclado = []
-            for i, opt in enumerate(todas_opciones):
-                texto = self.get_column_value(opt, ["Equivalente en Venezolano", "Equivalente"])
-                muestra = texto[:45] + "..." if len(texto) > 45 else texto
-                teclado.append(
-                    [InlineKeyboardButton(muestra, callback_data=f"ans_{i}_{index_correcto}_{correcto.name}")]
-                )
+            # 4 posiciones distintas: la primera es la correcta, el resto distractores
+            opciones = self._sample(self._quiz_pool, 4)
+            idx_real = opciones[0]
+            self._shuffle(opciones)
+
+            # callback_data compacto: "ans_<1 si es la correcta, si no 0>_<fila correcta>"
+            teclado = [
+                [
+                    InlineKeyboardButton(
+                        self._opciones_quiz[pos],
+                        callback_data=f"ans_{int(pos == idx_real)}_{idx_real}",
+                    )
+                ]
+                for pos in opciones
+            ]
             reply_markup = InlineKeyboardMarkup(teclado)
-            chengyu = self.get_column_value(correcto, ["Chengyu 成语", "Chengyu"])
-            pinyin = self.get_column_value(correcto, ["Pinyin", "pinyin"])
             await update.message.reply_text(
-                f"❓ *Quiz:* ¿Cuál es el equivalente venezolano de:\n\n*{chengyu}* ({pinyin})?",
+                self._preguntas[idx_real],
                 reply_markup=reply_markup,
-                parse_mode="Markdown",
+                parse_mode="MarkdownV2",
             )
         except Exception as e:
-            logger.error(f"Error en quiz: {e}")
+            logger.error("Error en quiz: %s", e)
             await update.message.reply_text("❌ Error al crear el quiz.")
 
     async def answer_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
         try:
-            partes = query.data.split("_")
-            elegido = int(partes[1])
-            correcto = int(partes[2])
-            idx_real = int(partes[3])
-            fila_correcta = self.df.loc[idx_real]
-            if elegido == correcto:
-                msg = "✅ ¡Correcto! "
+            _, acierto, idx_real = query.data.split("_")
+            if acierto == "1":
+                msg = "✅ ¡Correcto\\! "
             else:
-                msg = "❌ Incorrecto. "
-            msg += f"La respuesta correcta es:\n{self.format_chengyu(fila_correcta)}"
-            await query.edit_message_text(msg, parse_mode="Markdown")
+                msg = "❌ Incorrecto\\. "
+            msg += f"La respuesta correcta es:\n{self._formatted[int(idx_real)]}"
+            await query.edit_message_text(msg, parse_mode="MarkdownV2")
         except Exception as e:
-            logger.error(f"Error en answer_handler: {e}")
+            logger.error("Error en answer_handler: %s", e)
             await query.edit_message_text("❌ Error al procesar la respuesta.")
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        texto_ayuda = """
-🇨🇳 *Ayuda - Bot de Chengyus* 🇻🇪
-
-*Comandos:*
-/start - Mensaje de bienvenida
-/chengyu - Chengyu aleatorio
-/dia [1-50] - Chengyu por número
-/categorias - Explorar categorías
-/hsk [HSK6-9] - Filtrar por nivel
-/quiz - Quiz interactivo
-/ayuda - Mostrar esta ayuda
+        await update.message.reply_text(HELP_MSG, parse_mode="Markdown")
 
-*Ejemplos:*
-`/dia 15` - Chengyu del día 15
-`/hsk HSK7` - Chengyus nivel HSK7
-
-Los chengyus son expresiones idiomáticas chinas de 4 caracteres con gran significado cultural.
-
-¡Disfruta aprendiendo! 🎓
-"""
-        await update.message.reply_text(texto_ayuda, parse_mode="Markdown")
+    async def reload(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if user is None or user.id not in ADMIN_IDS:
+            await update.message.reply_text("⛔ Comando solo para administradores.")
+            return
+        await update.message.reply_text("🔄 Recargando datos...")
+        try:
+            await self.initialize()
+            await update.message.reply_text(
+                f"✅ Datos recargados: {self._n} chengyus ({self.data_source})"
+            )
+        except Exception as e:
+            logger.error("Error en reload: %s", e)
+            await update.message.reply_text("❌ Error al recargar los datos.")
 
 def main():
-    # Arrancar servidor Flask en hilo separado para puerto dummy
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
+    # uvloop como event loop si está disponible (no existe en Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        logger.info("uvloop no disponible, se usa el event loop por defecto")
 
     # Cargar token del bot desde variable de entorno
     token = os.getenv("BOT_TOKEN")
@@ -522,12 +1072,38 @@ def main():
         print("Error: Configura BOT_TOKEN en variables de entorno")
         return
 
+    if USE_WEBHOOK and not PUBLIC_URL:
+        logger.error("USE_WEBHOOK activo pero PUBLIC_URL no está configurada")
+        print("Error: Configura PUBLIC_URL para usar webhooks")
+        return
+
     logger.info("Iniciando bot de chengyus con prioridad en Excel, CSV y embebidos.")
 
     try:
+        # Los datos se cargan en un hilo tras arrancar, así el servidor de salud
+        # y el polling no esperan a que termine el parseo del Excel/CSV
+        bot = ChengyuBot(load_data=False)
+
+        async def post_init(application):
+            if not USE_WEBHOOK:
+                await start_health_server(application)
+            bot.start_loading()
+
+        async def post_shutdown(application):
+            await bot.stop_loading()
+            await shutdown_services(application)
+
         # Construir la aplicación del bot
-        application = Application.builder().token(token).build()
-        bot = ChengyuBot()
+        application = (
+            Application.builder()
+            .token(token)
+            # Peticiones normales y getUpdates (long polling) con clientes separados
+            .request(telegram_request())
+            .get_updates_request(telegram_request(pool_size=1))
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
 
         # Handlers de comandos
         application.add_handler(CommandHandler("start", bot.start))
@@ -537,22 +1113,33 @@ def main():
         application.add_handler(CommandHandler("hsk", bot.hsk_filter))
         application.add_handler(CommandHandler("quiz", bot.quiz))
         application.add_handler(CommandHandler("ayuda", bot.help_command))
+        application.add_handler(CommandHandler("reload", bot.reload))
 
         # Handlers para botones interactivos
         application.add_handler(CallbackQueryHandler(bot.category_handler, pattern=r"^cat_"))
         application.add_handler(CallbackQueryHandler(bot.answer_handler, pattern=r"^ans_"))
 
-        # Lanzar tarea keep-alive antes del polling
+        # Lanzar tarea keep-alive antes del polling/webhook
         asyncio.get_event_loop().create_task(keep_alive())
 
-        logger.info("Bot configurado exitosamente, iniciando polling…")
+        modo = "webhook" if USE_WEBHOOK else "polling"
+        logger.info("Bot configurado exitosamente, iniciando %s…", modo)
         print("✅ Bot iniciado correctamente")
 
-        # Ejecutar bot con polling
-        application.run_polling()
+        if USE_WEBHOOK:
+            # Telegram empuja cada update; el token en la ruta evita peticiones ajenas
+            application.run_webhook(
+                listen="0.0.0.0",
+                port=int(os.getenv("PORT", 10000)),
+                url_path=token,
+                webhook_url=f"{PUBLIC_URL.rstrip('/')}/{token}",
+            )
+        else:
+            # Ejecutar bot con polling
+            application.run_polling()
 
     except Exception as e:
-        logger.error(f"Error al iniciar bot: {e}")
+        logger.error("Error al iniciar bot: %s", e)
         print(f"Error al iniciar bot: {e}")
 
 if __name__ == "__main__":